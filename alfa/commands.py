@@ -1,22 +1,33 @@
-from io import StringIO
+import re
 from typing import List
 
 import sadisplay
 import uvicorn
-from ruamel.yaml import YAML
+import yaml
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:  # pyyaml built without libyaml
+    from yaml import SafeDumper  # type: ignore [assignment]
+
+_PLANTUML_MARKERS = {'@startuml': '```plantuml\n@startuml', '@enduml': '@enduml\n```'}
+_PLANTUML_MARKERS_RE = re.compile('|'.join(_PLANTUML_MARKERS))
 
 
 def get_db_docs(models: List) -> str:  # type: ignore [type-arg]
     desc = sadisplay.describe(models)
     docs: str = sadisplay.plantuml(desc)
-    docs = docs.replace('@startuml', '```plantuml\n@startuml')
-    docs = docs.replace('@enduml', '@enduml\n```')
-    return docs
+    return _PLANTUML_MARKERS_RE.sub(lambda m: _PLANTUML_MARKERS[m.group()], docs)
 
 
 def get_openapi_docs(server: uvicorn.Server) -> str:
-    yaml_str = StringIO()
-    yaml = YAML()
-    yaml.indent(mapping=2, sequence=4, offset=2)
-    yaml.dump(server.config.app.openapi(), yaml_str)
-    return yaml_str.getvalue()
+    # FastAPI caches the schema itself in app.openapi_schema
+    docs: str = yaml.dump(
+        server.config.app.openapi(),
+        Dumper=SafeDumper,
+        default_flow_style=False,
+        sort_keys=False,
+        allow_unicode=True,
+        indent=2,
+    )
+    return docs
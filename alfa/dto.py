@@ -1,14 +1,26 @@
 import socket
 from typing import Any, Dict, List, Union
 
+import orjson
 from pydantic import BaseModel as BM
 from pydantic import BaseSettings, Field
 
 from .const import StrEnum
 
+try:
+    import msgspec
+except ImportError:
+    msgspec = None  # type: ignore
+
+_HOSTNAME = socket.gethostname()
+
 
 class BaseDTO(BM):
-    pass
+    class Config:
+        # .json() keeps pydantic's json.dumps: orjson rejects non-str keys and dumps kwargs like indent
+        json_loads = orjson.loads
+        # nested models are already validated, skip copying them
+        copy_on_model_validation = 'none'
 
 
 class UnknownError(BaseDTO):
@@ -43,6 +55,16 @@ class StrictBaseDTO(BaseDTO):
         extra = 'forbid'
 
 
+if msgspec is not None:
+
+    class FastDTO(msgspec.Struct):
+        """
+        Response DTO for hot paths, encoded by msgspec straight to bytes, without pydantic validation.
+        Available with optional msgspec dependency. Decimals are numbers like in BaseDTO responses,
+        but times keep seconds ("03:04:00" instead of "03:04") and UTC datetimes end with "Z", also when nested.
+        """
+
+
 errors: Dict[Union[int, str], Dict[str, Any]] = {
     400: {'model': InvalidRequestError},
     422: {'model': BusinessError},
@@ -71,7 +93,7 @@ class Version(BaseSettings):
         return f'{self.git_branch}-{self.build_number}'
 
     def get_instance_id(self) -> str:
-        return socket.gethostname()
+        return _HOSTNAME
 
 
 class VersionResp(Version):
@@ -1,4 +1,3 @@
-import asyncio
 import datetime as dt
 import logging
 
@@ -131,4 +130,5 @@ def get_http_server() -> uvicorn.Server:
 
 if __name__ == "__main__":
     uvicorn_server = get_http_server()
-    asyncio.run(uvicorn_server.serve())
+    # sets up uvloop event loop if it is installed
+    uvicorn_server.run()
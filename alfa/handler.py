@@ -1,5 +1,7 @@
 import logging
 import os
+import time
+from typing import Optional, Tuple
 
 from fastapi import APIRouter
 from fastapi.responses import PlainTextResponse
@@ -9,6 +11,10 @@ from starlette.responses import Response
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+METRICS_CACHE_TTL = 1.0
+# (monotonic time of generation, output)
+_metrics_cache: Optional[Tuple[float, bytes]] = None
+
 
 @router.get('/alive', response_class=PlainTextResponse)
 async def alive() -> PlainTextResponse:
@@ -17,13 +23,18 @@ async def alive() -> PlainTextResponse:
 
 @router.get('/metrics')
 async def metrics() -> Response:
-    registry = REGISTRY
+    global _metrics_cache
+    headers = {'Content-Type': CONTENT_TYPE_LATEST}
+
     if 'prometheus_multiproc_dir' in os.environ:
         registry = CollectorRegistry()
         multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), status_code=200, headers=headers)
 
-    headers = {'Content-Type': CONTENT_TYPE_LATEST}
-    return Response(generate_latest(registry), status_code=200, headers=headers)
+    now = time.monotonic()
+    if _metrics_cache is None or now - _metrics_cache[0] >= METRICS_CACHE_TTL:
+        _metrics_cache = now, generate_latest(REGISTRY)
+    return Response(_metrics_cache[1], status_code=200, headers=headers)
 
 
 @router.get('/error')
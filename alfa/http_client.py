@@ -1,7 +1,6 @@
 import logging
 from logging import Logger
 from typing import Any, Dict, Optional
-from urllib.parse import urljoin
 
 import httpx
 import orjson
@@ -29,12 +28,18 @@ class HttpClientMixin:
         self.logger = logging.getLogger(self.logger_name)
         self.app_name = app_name
         self.app_version = app_version
+        # one client per instance keeps connections alive between requests
+        self._client = httpx.AsyncClient(
+            base_url=host,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+        )
 
-    def _get_url(self, url: str) -> str:
-        return urljoin(self.host, url)
+    async def aclose(self) -> None:
+        await self._client.aclose()
 
-    def _get_json_body(self, data: Dict[Any, Any]) -> str:
-        return orjson.dumps(data).decode()
+    def _get_json_body(self, data: Dict[Any, Any]) -> bytes:
+        return orjson.dumps(data)
 
     def _get_default_headers(self) -> Dict[str, str]:
         return {
@@ -52,22 +57,26 @@ class HttpClientMixin:
         headers.update(get_tracing_http_headers())
         return headers
 
-    async def _get_parsed_response(self, url: str, body: str, headers: Optional[Dict[str, str]] = None) -> Any:
+    async def _get_parsed_response(self, url: str, body: bytes, headers: Optional[Dict[str, str]] = None) -> Any:
         headers = self._build_headers(headers=headers)
-        self.logger.debug('request', **log_extra(url=url, body=body, headers=headers))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            # json text in logs, not bytes repr
+            self.logger.debug('request', **log_extra(url=url, body=body.decode(errors='replace'), headers=headers))
         try:
-            async with httpx.AsyncClient() as client:
-                r = await client.post(url, data=body, timeout=self.timeout, headers=headers or {})  # type: ignore [arg-type]
+            r = await self._client.post(url, content=body, headers=headers or {})
         except Exception:
             self.logger.exception(f'{self.logger_name}: unknown http error')
             return
         else:
             self.logger.debug('response', **log_extra(url=url, response=r.content))
 
+        if r.status_code != 200:
+            return None
+
         try:
-            data = r.json()
+            data = orjson.loads(r.content)
         except Exception:
             self.logger.exception(f'{self.logger_name}: cant parse json', **log_extra(content=r.content))
             return
         else:
-            return data if r.status_code == 200 else None
+            return data
@@ -24,21 +24,24 @@ class MyLocalFormatter(coloredlogs.ColoredFormatter):
 class MyJsonFormatter(JsonFormatter):
     RENAME_FIELDS = {'levelname': 'level', 'asctime': 'ts', 'message': 'msg', 'name': 'caller'}
 
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)  # type: ignore[no-untyped-call]
+        # (log_record key, record attribute) pairs, computed once per formatter
+        self._fields_plan = [(self.RENAME_FIELDS.get(field, field), field) for field in self._required_fields]
+        self._timestamp_key = self.timestamp if isinstance(self.timestamp, str) else 'timestamp'
+
     def add_fields(self, log_record, record, message_dict):
         """
         Override this method to implement custom logic for adding fields.
         """
-        for field in self._required_fields:
-            if field in self.RENAME_FIELDS:
-                log_record[self.RENAME_FIELDS[field]] = record.__dict__.get(field)
-            else:
-                log_record[field] = record.__dict__.get(field)
+        record_dict = record.__dict__
+        for key, field in self._fields_plan:
+            log_record[key] = record_dict.get(field)
         log_record.update(message_dict)
         merge_record_extra(record, log_record, reserved=self._skip_fields)
 
         if self.timestamp:
-            key = self.timestamp if type(self.timestamp) == str else 'timestamp'
-            log_record[key] = datetime.fromtimestamp(record.created, tz=timezone.utc)
+            log_record[self._timestamp_key] = datetime.fromtimestamp(record.created, tz=timezone.utc)
 
 
 def _get_logger_level(logger_name: str, debug_loggers: Optional[list[str]] = None) -> int:
@@ -90,16 +93,21 @@ def log_extra(**kwargs: Any) -> Dict[str, Any]:
 
 def log_method(logger_name: str) -> Callable[..., Any]:
     def wrapper(f: Callable[..., Any]) -> Callable[..., Any]:
+        _logger = logging.getLogger(logger_name)
+        start_msg = f'{f.__qualname__}: start'
+        finish_msg = f'{f.__qualname__}: finish'
+
         @wraps(f)
         async def wrapped(self: Any, *args: Any, **kwargs: Any) -> Any:
+            if not _logger.isEnabledFor(logging.DEBUG):
+                return await f(self, *args, **kwargs)
 
-            _logger = logging.getLogger(logger_name)
             if args:
-                _logger.debug(f'{f.__qualname__}: start', **log_extra(args=args))
+                _logger.debug(start_msg, **log_extra(args=args))
             else:
-                _logger.debug(f'{f.__qualname__}: start')
+                _logger.debug(start_msg)
             result: Any = await f(self, *args, **kwargs)
-            _logger.debug(f'{f.__qualname__}: finish')
+            _logger.debug(finish_msg)
 
             return result
 
@@ -110,16 +118,21 @@ def log_method(logger_name: str) -> Callable[..., Any]:
 
 def log_sync_method(logger_name: str) -> Callable[..., Any]:
     def wrapper(f: Callable[..., Any]) -> Callable[..., Any]:
+        _logger = logging.getLogger(logger_name)
+        start_msg = f'{f.__qualname__}: start'
+        finish_msg = f'{f.__qualname__}: finish'
+
         @wraps(f)
         def wrapped(self: Any, *args: Any, **kwargs: Any) -> Any:
+            if not _logger.isEnabledFor(logging.DEBUG):
+                return f(self, *args, **kwargs)
 
-            _logger = logging.getLogger(logger_name)
             if args:
-                _logger.debug(f'{f.__qualname__}: start', **log_extra(args=args))
+                _logger.debug(start_msg, **log_extra(args=args))
             else:
-                _logger.debug(f'{f.__qualname__}: start')
+                _logger.debug(start_msg)
             result: Any = f(self, *args, **kwargs)
-            _logger.debug(f'{f.__qualname__}: finish')
+            _logger.debug(finish_msg)
 
             return result
 
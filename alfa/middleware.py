@@ -2,69 +2,127 @@ from __future__ import annotations
 
 import logging
 import time
+from typing import Any, Optional
 from urllib.parse import urlunparse
 
 import opentracing
-from fastapi.responses import ORJSONResponse
+import orjson
 from jaeger_client import Tracer
 from opentracing.ext import tags
 from prometheus_client import Histogram
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.requests import Request
 from starlette.responses import Response
-from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from alfa.logger import log_extra
 
 from .dto import UnknownError
-from .opentracing import get_current_trace_id, get_tracing_http_headers
+from .opentracing import get_current_span, get_current_trace_id, get_tracing_http_headers
 
 logger = logging.getLogger(__name__)
 
+# k8s probes and metrics scrapes are not logged, traced or measured
+_SKIP_PATHS = frozenset({'/alive', '/metrics'})
+
+_UNKNOWN_ERROR_DICT = UnknownError(code=UnknownError.ErrorCode.UNKNOWN).dict()
+_UNKNOWN_ERROR_BODY = orjson.dumps(_UNKNOWN_ERROR_DICT)
+_UNKNOWN_ERROR_HEADERS = (
+    (b'content-type', b'application/json'),
+    (b'content-length', str(len(_UNKNOWN_ERROR_BODY)).encode()),
+)
+
+
+class ExceptionMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message['type'] == 'http.response.start':
+                response_started = True
+            await send(message)
 
-class ExceptionMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_wrapper)
         except Exception:
             logger.exception('unknown exception')
-            return ORJSONResponse(status_code=500, content=UnknownError(code=UnknownError.ErrorCode.UNKNOWN).dict())
-        else:
-            return response
+            if response_started:
+                # headers already sent, nothing can be done with the response
+                return
+            # outer middlewares may mutate the message, so headers list is built per response
+            await send({'type': 'http.response.start', 'status': 500, 'headers': list(_UNKNOWN_ERROR_HEADERS)})
+            await send({'type': 'http.response.body', 'body': _UNKNOWN_ERROR_BODY})
 
 
-class AccessLogMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+class AccessLogMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or scope['path'] in _SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+
         trace_id = get_current_trace_id()
-        start = time.monotonic()
+        start_ns = time.perf_counter_ns()
+        status_code = 500
         logger.info(
-            f"request start",
-            **log_extra(method=request.scope['method'], request_uri=request.scope['path'], trace_id=trace_id),
+            f"request start", **log_extra(method=scope['method'], request_uri=scope['path'], trace_id=trace_id),
         )
-        response = await call_next(request)
-        duration = int((time.monotonic() - start) * 1000)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+        duration = (time.perf_counter_ns() - start_ns) // 1_000_000
         logger.info(
             f"request end",
             **log_extra(
-                method=request.scope['method'],
-                status_code=response.status_code,
-                request_uri=request.scope['path'],
+                method=scope['method'],
+                status_code=status_code,
+                request_uri=scope['path'],
                 duration=duration,
                 trace_id=trace_id,
             ),
         )
-        return response
 
 
-class TracingResponseHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
-        response = await call_next(request)
-        headers = get_tracing_http_headers()
-        trace_id = get_current_trace_id() or ''
-        response.headers['x-trace-id'] = trace_id
-        for _header in headers:
-            response.headers[_header] = headers[_header]
-        return response
+class TracingResponseHeadersMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or scope['path'] in _SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                raw_headers = list(message.get('headers', []))
+                span = get_current_span()
+                if span is None:
+                    raw_headers.append((b'x-trace-id', b''))
+                else:
+                    trace_id = get_current_trace_id(span) or ''
+                    raw_headers.append((b'x-trace-id', trace_id.encode()))
+                    headers = get_tracing_http_headers(span)
+                    for _header in headers:
+                        raw_headers.append((_header.lower().encode(), headers[_header].encode()))
+                message['headers'] = raw_headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 
 labels = (
@@ -151,11 +209,42 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
         self.service_namespace = service_namespace
         self.service_version = service_version
         self.service_instance_id = service_instance_id
+        # service_name, service_namespace, service_version, service_instance_id
+        self._service_labels = (service_name, service_namespace, service_version, service_instance_id)
+        # id(endpoint) -> path used to mount the endpoint
+        self._endpoint_path_cache: dict[int, str] = {}
+        # labels that vary per request -> labelled histogram
+        self._histogram_cache: dict[tuple[Any, ...], Histogram] = {}
+
+    def _get_route_path(self, scope: Scope) -> Optional[str]:
+        endpoint = scope['endpoint']
+        path = self._endpoint_path_cache.get(id(endpoint))
+        if path is None:
+            route = next(
+                (
+                    route
+                    for route in scope['router'].routes
+                    if (hasattr(route, 'endpoint') and route.endpoint == endpoint)
+                    # for endpoints handled by another app, like fastapi.staticfiles.StaticFiles,
+                    # check if the request endpoint matches a mounted app.
+                    or (hasattr(route, 'app') and route.app == endpoint)
+                ),
+                None,
+            )
+            if route is not None:
+                path = self._endpoint_path_cache[id(endpoint)] = route.path
+        return path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'http' and scope['path'] in _SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
 
     async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
         method = request.method
         path = request.url.path
-        begin = time.time()
+        begin_ns = time.perf_counter_ns()
         status_code = 500
 
         try:
@@ -171,43 +260,46 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
                 try:
                     # try to match the request scope's handler function against one of handlers in the app's router.
                     # if a match is found, return the path used to mount the handler (e.g. api/product/{product_id}).
-                    path = [
-                        route
-                        for route in request.scope['router'].routes
-                        if (hasattr(route, 'endpoint') and route.endpoint == request.scope['endpoint'])
-                        # for endpoints handled by another app, like fastapi.staticfiles.StaticFiles,
-                        # check if the request endpoint matches a mounted app.
-                        or (hasattr(route, 'app') and route.app == request.scope['endpoint'])
-                    ][0].path
-                except IndexError:
-                    # no route matched.
+                    # keep the raw path if no route matched,
                     # this can happen for routes that don't have an endpoint function.
-                    pass
+                    path = self._get_route_path(request.scope) or path
                 except Exception as e:
                     logger.error(e)
-            end = time.time()
+            end_ns = time.perf_counter_ns()
 
-            labels = [
+            key = (
                 request.scope.get('http_version', 'unknown'),  # http_flavor
                 request.headers.get('host', 'unknown'),  # http_host
                 method,  # http_method
-                path,  # http_route
+                path,  # http_route, http_target
                 request.scope.get('scheme', 'unknown'),  # http_scheme
-                'rpc',  # http_server_name
-                path,  # http_target
                 status_code,  # http_status_code
-                self.service_name,  # service_name
-                self.service_namespace,  # service_namespace
-                self.service_version,  # service_version
-                self.service_instance_id,  # service_instance_id
-            ]
-            # latency = (end - begin) * 1000  # in milliseconds
-            latency = end - begin  # in seconds
-            REQUEST_TIME.labels(*labels).observe(latency)
+            )
+            child = self._histogram_cache.get(key)
+            if child is None:
+                flavor, host, method, path, scheme, status_code = key
+                child = self._histogram_cache[key] = REQUEST_TIME.labels(
+                    flavor,  # http_flavor
+                    host,  # http_host
+                    method,  # http_method
+                    path,  # http_route
+                    scheme,  # http_scheme
+                    'rpc',  # http_server_name
+                    path,  # http_target
+                    status_code,  # http_status_code
+                    *self._service_labels,
+                )
+            # latency = (end_ns - begin_ns) // 1_000_000  # in milliseconds
+            latency = (end_ns - begin_ns) / 1e9  # in seconds
+            child.observe(latency)
 
         return response
 
 
+# b3 and jaeger propagation headers
+_TRACING_HEADERS_PREFIXES = (b'x-b3-', b'b3', b'uber-trace-id', b'uberctx-', b'jaeger-')
+
+
 class StarletteTracingMiddleWare:
     def __init__(self, app: ASGIApp, tracer: Tracer, component_name: str):
         self._tracer = tracer
@@ -219,11 +311,19 @@ class StarletteTracingMiddleWare:
         if scope["type"] not in ["http", "websocket"]:
             return
 
+        # probes and metrics scrapes produce useless spans
+        if scope["path"] in _SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+
         # Try to find and existing context in the provided request headers
+        # ASGI servers provide lowercased header names, only propagation headers are decoded
         span_ctx = None
-        headers = {}
-        for k, v in scope["headers"]:
-            headers[k.lower().decode("utf-8")] = v.decode("utf-8")
+        headers = {
+            k.decode("latin-1"): v.decode("latin-1")
+            for k, v in scope["headers"]
+            if k.startswith(_TRACING_HEADERS_PREFIXES)
+        }
         try:
             span_ctx = self._tracer.extract(opentracing.Format.HTTP_HEADERS, headers)
         except (opentracing.propagation.InvalidCarrierException, opentracing.propagation.SpanContextCorruptedException):
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import asyncio
 import inspect
 import logging
-from functools import wraps
-from typing import Any, Callable, Dict, Optional, cast
+import threading
+import time
+from contextvars import ContextVar
+from functools import partial, wraps
+from random import random
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, cast
 
 from jaeger_client import Config, Tracer
 from jaeger_client.span import Span
@@ -12,6 +17,8 @@ from opentracing.propagation import Format
 from opentracing.scope_managers.contextvars import ContextVarsScopeManager
 
 tracer: Tracer
+_TRACER_READY = threading.Event()
+_TRACING_ENABLED: bool = False
 logger = logging.getLogger(__name__)
 
 
@@ -23,49 +30,141 @@ class IsNotAwaitable(Exception):
     ...
 
 
-def configure_tracing(app_name: str, host: str, port: int, propagation: str, jaeger_enabled: bool) -> Tracer:
-    global tracer
-    config = Config(
+def _get_config(
+    app_name: str,
+    host: str,
+    port: int,
+    propagation: str,
+    jaeger_enabled: bool,
+    reporter_queue_size: int,
+    reporter_batch_size: int,
+    reporter_flush_interval: float,
+) -> Config:
+    return Config(
         config={
             'sampler': {'type': 'const', 'param': 1},
             'logging': False,
             'local_agent': {'reporting_host': host, 'reporting_port': port},
             'propagation': propagation,
             'enabled': jaeger_enabled,
+            'reporter_queue_size': reporter_queue_size,
+            'reporter_batch_size': reporter_batch_size,
+            'reporter_flush_interval': reporter_flush_interval,
         },
         validate=True,
         scope_manager=ContextVarsScopeManager(),
         service_name=app_name,
     )
-    _tracer: Optional[Tracer] = config.initialize_tracer()
+
+
+def _set_tracer(_tracer: Optional[Tracer], jaeger_enabled: bool) -> Tracer:
+    global tracer
+    global _TRACING_ENABLED
+    # jaeger инициализирует трейсер только один раз, повторные вызовы возвращают None
     if _tracer:
         tracer = _tracer
+        _TRACING_ENABLED = jaeger_enabled
+        _TRACER_READY.set()
     return tracer
 
 
+def configure_tracing(
+    app_name: str,
+    host: str,
+    port: int,
+    propagation: str,
+    jaeger_enabled: bool,
+    reporter_queue_size: int = 4096,
+    reporter_batch_size: int = 64,
+    reporter_flush_interval: float = 1.0,
+) -> Tracer:
+    """
+    Спаны отправляются в jaeger-agent пачками в фоне, при переполнении очереди репортера новые спаны отбрасываются.
+    reporter_batch_size должен быть таким, чтобы пачка помещалась в один UDP пакет.
+    """
+    config = _get_config(
+        app_name,
+        host,
+        port,
+        propagation,
+        jaeger_enabled,
+        reporter_queue_size,
+        reporter_batch_size,
+        reporter_flush_interval,
+    )
+    return _set_tracer(config.initialize_tracer(), jaeger_enabled)
+
+
+async def configure_tracing_async(
+    app_name: str,
+    host: str,
+    port: int,
+    propagation: str,
+    jaeger_enabled: bool,
+    reporter_queue_size: int = 4096,
+    reporter_batch_size: int = 64,
+    reporter_flush_interval: float = 1.0,
+) -> Tracer:
+    """
+    То же, что configure_tracing, но инициализация трейсера выполняется в пуле потоков и не блокирует event loop.
+    Дождаться готовности трейсера из другого места можно через warmup().
+    """
+    config = _get_config(
+        app_name,
+        host,
+        port,
+        propagation,
+        jaeger_enabled,
+        reporter_queue_size,
+        reporter_batch_size,
+        reporter_flush_interval,
+    )
+    loop = asyncio.get_running_loop()
+    return _set_tracer(await loop.run_in_executor(None, config.initialize_tracer), jaeger_enabled)
+
+
+async def warmup(timeout: Optional[float] = None) -> Tracer:
+    """
+    Ждет, пока configure_tracing или configure_tracing_async установит трейсер.
+    """
+    loop = asyncio.get_running_loop()
+    if not _TRACER_READY.is_set():
+        await loop.run_in_executor(None, _TRACER_READY.wait, timeout)
+    return get_tracer()
+
+
 def get_tracer() -> Tracer:
-    global tracer
-    if not tracer:
+    if not _TRACER_READY.is_set():
         logger.warning('configure_tracing first')
-    assert tracer
+    assert _TRACER_READY.is_set()
     return tracer
 
 
+def is_tracing_enabled() -> bool:
+    """
+    Трейсер настроен и отправляет спаны, его репортер работает в фоновом потоке текущего процесса.
+    """
+    return _TRACING_ENABLED
+
+
 def get_current_span() -> Optional[Span]:
     tracer = get_tracer()
     active = tracer.scope_manager.active
     return cast(Span, active.span) if active else None
 
 
-def get_current_trace_id() -> Optional[str]:
-    span = get_current_span()
+def get_current_trace_id(span: Optional[Span] = None) -> Optional[str]:
+    if span is None:
+        active = get_tracer().scope_manager.active
+        span = active.span if active else None
     trace_id = span.trace_id if span else None
-    return '{:x}'.format(trace_id) if trace_id else None
+    return f'{trace_id:x}' if trace_id else None
 
 
-def get_tracing_http_headers() -> Dict[str, str]:
+def get_tracing_http_headers(span: Optional[Span] = None) -> Dict[str, str]:
     tracer = get_tracer()
-    span = get_current_span()
+    if span is None:
+        span = get_current_span()
     if not span:
         return {}
     span.set_tag(tags.SPAN_KIND, tags.SPAN_KIND_RPC_CLIENT)
@@ -74,36 +173,43 @@ def get_tracing_http_headers() -> Dict[str, str]:
     return headers
 
 
-def _get_span_and_scope(f: Callable[..., Any], **kwargs: Any):
-    db_query = kwargs.get('query', None)
-    current_tags = {}
+def _accepts_query(f: Callable[..., Any]) -> bool:
+    """
+    Может ли функция получить query в kwargs, проверяется один раз при декорировании.
+    """
+    try:
+        parameters = inspect.signature(f).parameters.values()
+    except (TypeError, ValueError):
+        return True
+    return any(p.name == 'query' or p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters)
+
+
+def _get_span_and_scope(operation_name: str, db_query: Optional[Any] = None):
+    current_tags = None
     if db_query is not None:
-        current_tags[tags.DATABASE_TYPE] = 'postgres'
-        current_tags[tags.DATABASE_STATEMENT] = db_query
+        current_tags = {tags.DATABASE_TYPE: 'postgres', tags.DATABASE_STATEMENT: db_query}
 
     tracer = get_tracer()
-    span = tracer.start_span(operation_name=f.__qualname__, child_of=get_current_span(), tags=current_tags)
+    span = tracer.start_span(operation_name=operation_name, child_of=get_current_span(), tags=current_tags)
     scope = tracer.scope_manager.activate(span, True)
     return span, scope
 
 
-def trace_fn(f: Callable[..., Any]) -> Callable[..., Any]:
+def _wrap_sync(f: Callable[..., Any], sample: float = 1.0) -> Callable[..., Any]:
     """
-    Используется для отслеживания синхронных функций.
-
-    Пример
-    ------
-    >>> @trace_fn
-    ... def any_function(*args, **kwargs):
-    ...     pass
-    ...
+    Спан не создается, если трейсинг выключен, и создается только для доли sample вызовов.
     """
-    if inspect.iscoroutinefunction(f):
-        raise IsAwaitable(f'{f.__qualname__} is awaitable. Use @trace_async_fn decorator instead.')
+    qualname = f.__qualname__
+    has_query = _accepts_query(f)
+    sampled = sample < 1.0
 
+    # self/cls приходят в args, поэтому одна обертка подходит для функций, методов и классовых методов
     @wraps(f)
     def wrapper(*args: Any, **kwargs: Any) -> Any:
-        span, scope = _get_span_and_scope(f, **kwargs)
+        if not _TRACING_ENABLED or (sampled and random() >= sample):
+            return f(*args, **kwargs)
+
+        span, scope = _get_span_and_scope(qualname, kwargs.get('query') if has_query else None)
         try:
             result = f(*args, **kwargs)
         except Exception as error:
@@ -117,23 +223,17 @@ def trace_fn(f: Callable[..., Any]) -> Callable[..., Any]:
     return wrapper
 
 
-def trace_async_fn(f: Callable[..., Any]) -> Callable[..., Any]:
-    """
-    Используется для отслеживания асинхронных функций.
-
-    Пример
-    ------
-    >>> @trace_async_fn
-    ... async def any_function(*args, **kwargs):
-    ...     pass
-    ...
-    """
-    if not inspect.iscoroutinefunction(f):
-        raise IsNotAwaitable(f'{f.__qualname__} is not awaitable. Use @trace_fn decorator instead.')
+def _wrap_async(f: Callable[..., Any], sample: float = 1.0) -> Callable[..., Any]:
+    qualname = f.__qualname__
+    has_query = _accepts_query(f)
+    sampled = sample < 1.0
 
     @wraps(f)
     async def wrapper(*args: Any, **kwargs: Any) -> Any:
-        span, scope = _get_span_and_scope(f, **kwargs)
+        if not _TRACING_ENABLED or (sampled and random() >= sample):
+            return await f(*args, **kwargs)
+
+        span, scope = _get_span_and_scope(qualname, kwargs.get('query') if has_query else None)
         try:
             result = await f(*args, **kwargs)
         except Exception as error:
@@ -147,7 +247,49 @@ def trace_async_fn(f: Callable[..., Any]) -> Callable[..., Any]:
     return wrapper
 
 
-def trace_method(f: Callable[..., Any]) -> Callable[..., Any]:
+def trace_fn(f: Optional[Callable[..., Any]] = None, *, sample: float = 1.0) -> Callable[..., Any]:
+    """
+    Используется для отслеживания синхронных функций.
+
+    Пример
+    ------
+    >>> @trace_fn
+    ... def any_function(*args, **kwargs):
+    ...     pass
+    ...
+
+    Спан только для 10% вызовов
+    >>> @trace_fn(sample=0.1)
+    ... def hot_function(*args, **kwargs):
+    ...     pass
+    ...
+    """
+    if f is None:
+        return partial(trace_fn, sample=sample)
+    if inspect.iscoroutinefunction(f):
+        raise IsAwaitable(f'{f.__qualname__} is awaitable. Use @trace_async_fn decorator instead.')
+    return _wrap_sync(f, sample)
+
+
+def trace_async_fn(f: Optional[Callable[..., Any]] = None, *, sample: float = 1.0) -> Callable[..., Any]:
+    """
+    Используется для отслеживания асинхронных функций.
+
+    Пример
+    ------
+    >>> @trace_async_fn
+    ... async def any_function(*args, **kwargs):
+    ...     pass
+    ...
+    """
+    if f is None:
+        return partial(trace_async_fn, sample=sample)
+    if not inspect.iscoroutinefunction(f):
+        raise IsNotAwaitable(f'{f.__qualname__} is not awaitable. Use @trace_fn decorator instead.')
+    return _wrap_async(f, sample)
+
+
+def trace_method(f: Optional[Callable[..., Any]] = None, *, sample: float = 1.0) -> Callable[..., Any]:
     """
     Используется для отслеживания синхронных методов.
 
@@ -159,26 +301,14 @@ def trace_method(f: Callable[..., Any]) -> Callable[..., Any]:
     ...         pass
     ...
     """
+    if f is None:
+        return partial(trace_method, sample=sample)
     if inspect.iscoroutinefunction(f):
         raise IsAwaitable(f'{f.__qualname__} is awaitable. Use @trace_async_method decorator instead.')
+    return _wrap_sync(f, sample)
 
-    @wraps(f)
-    def wrapper(self, *args: Any, **kwargs: Any) -> Any:
-        span, scope = _get_span_and_scope(f, **kwargs)
-        try:
-            result = f(self, *args, **kwargs)
-        except Exception as error:
-            span.set_tag(tags.ERROR, True)
-            span.set_tag('error.message', str(error))
-            raise error
-        finally:
-            scope.close()
-        return result
-
-    return wrapper
 
-
-def trace_async_method(f: Callable[..., Any]) -> Callable[..., Any]:
+def trace_async_method(f: Optional[Callable[..., Any]] = None, *, sample: float = 1.0) -> Callable[..., Any]:
     """
     Используется для отслеживания асинхронных методов.
 
@@ -190,26 +320,14 @@ def trace_async_method(f: Callable[..., Any]) -> Callable[..., Any]:
     ...         pass
     ...
     """
+    if f is None:
+        return partial(trace_async_method, sample=sample)
     if not inspect.iscoroutinefunction(f):
         raise IsNotAwaitable(f'{f.__qualname__} is not awaitable. Use @trace_method decorator instead.')
-
-    @wraps(f)
-    async def wrapper(self, *args: Any, **kwargs: Any) -> Any:
-        span, scope = _get_span_and_scope(f, **kwargs)
-        try:
-            result = await f(self, *args, **kwargs)
-        except Exception as error:
-            span.set_tag(tags.ERROR, True)
-            span.set_tag('error.message', str(error))
-            raise error
-        finally:
-            scope.close()
-        return result
-
-    return wrapper
+    return _wrap_async(f, sample)
 
 
-def trace_classmethod(f: Callable[..., Any]) -> Callable[..., Any]:
+def trace_classmethod(f: Optional[Callable[..., Any]] = None, *, sample: float = 1.0) -> Callable[..., Any]:
     """
     Используется для отслеживания синхронных классовых методов.
 
@@ -222,26 +340,14 @@ def trace_classmethod(f: Callable[..., Any]) -> Callable[..., Any]:
     ...         pass
     ...
     """
+    if f is None:
+        return partial(trace_classmethod, sample=sample)
     if inspect.iscoroutinefunction(f):
         raise IsAwaitable(f'{f.__qualname__} is awaitable. Use @trace_async_classmethod decorator instead.')
-
-    @wraps(f)
-    def wrapper(cls, *args: Any, **kwargs: Any) -> Any:
-        span, scope = _get_span_and_scope(f, **kwargs)
-        try:
-            result = f(cls, *args, **kwargs)
-        except Exception as error:
-            span.set_tag(tags.ERROR, True)
-            span.set_tag('error.message', str(error))
-            raise error
-        finally:
-            scope.close()
-        return result
-
-    return wrapper
+    return _wrap_sync(f, sample)
 
 
-def trace_async_classmethod(f: Callable[..., Any]) -> Callable[..., Any]:
+def trace_async_classmethod(f: Optional[Callable[..., Any]] = None, *, sample: float = 1.0) -> Callable[..., Any]:
     """
     Используется для отслеживания асинхронных классовых методов.
 
@@ -254,21 +360,119 @@ def trace_async_classmethod(f: Callable[..., Any]) -> Callable[..., Any]:
     ...         pass
     ...
     """
+    if f is None:
+        return partial(trace_async_classmethod, sample=sample)
     if not inspect.iscoroutinefunction(f):
         raise IsNotAwaitable(f'{f.__qualname__} is not awaitable. Use @trace_classmethod decorator instead.')
+    return _wrap_async(f, sample)
+
+
+class _HotSpan:
+    """
+    Общий спан для подряд идущих одинаковых вызовов.
+    Новые вызовы перестают попадать в спан по окончании окна или при другом вызове,
+    сам спан завершается временем окончания последнего вызова, когда выполняющихся вызовов не осталось.
+    """
+
+    __slots__ = ('key', 'span', 'count', 'in_flight', 'last_end', 'deadline_ns', 'timer', 'closed', 'finished')
+
+    def __init__(self, key: Tuple[str, Hashable], span: Span, deadline_ns: int) -> None:
+        self.key = key
+        self.span = span
+        self.count = 0
+        self.in_flight = 0
+        self.last_end: Optional[float] = None
+        self.deadline_ns = deadline_ns
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.closed = False
+        self.finished = False
+
+    def enter(self) -> None:
+        self.count += 1
+        self.in_flight += 1
+
+    def exit(self) -> None:
+        self.in_flight -= 1
+        self.last_end = time.time()
+        if self.closed and not self.in_flight:
+            self._finish()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self.timer is not None:
+            self.timer.cancel()
+        if not self.in_flight:
+            self._finish()
+
+    def _finish(self) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        self.span.set_tag('batch.count', self.count)
+        self.span.finish(finish_time=self.last_end)
+
+
+_hot_span: ContextVar[Optional[_HotSpan]] = ContextVar('hot_span', default=None)
+
+
+def trace_hot(f: Optional[Callable[..., Any]] = None, *, aggregate_window_ms: int = 50) -> Callable[..., Any]:
+    """
+    Используется для отслеживания асинхронных функций и методов, которые вызываются в циклах.
+    Подряд идущие вызовы с тем же query в течение aggregate_window_ms попадают в один спан с тегом batch.count.
+
+    Пример
+    ------
+    >>> class AnyClass:
+    ...     @trace_hot(aggregate_window_ms=100)
+    ...     async def any_method(self, *args, **kwargs):
+    ...         pass
+    ...
+    """
+    if f is None:
+        return partial(trace_hot, aggregate_window_ms=aggregate_window_ms)
+    if not inspect.iscoroutinefunction(f):
+        raise IsNotAwaitable(f'{f.__qualname__} is not awaitable. Use @trace_fn decorator instead.')
+
+    qualname = f.__qualname__
+    has_query = _accepts_query(f)
+    window_ns = aggregate_window_ms * 1_000_000
 
     @wraps(f)
-    async def wrapper(cls, *args: Any, **kwargs: Any) -> Any:
-        span, scope = _get_span_and_scope(f, **kwargs)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not _TRACING_ENABLED:
+            return await f(*args, **kwargs)
+
+        db_query = kwargs.get('query') if has_query else None
+        # sqlalchemy clauses overload ==, so only str queries are compared by value
+        key = (qualname, db_query if db_query is None or isinstance(db_query, str) else id(db_query))
+        now_ns = time.monotonic_ns()
+        hot = _hot_span.get()
+        _tracer = get_tracer()
+        if hot is None or hot.closed or hot.key != key or now_ns >= hot.deadline_ns:
+            if hot is not None:
+                hot.close()
+            current_tags = None
+            if db_query is not None:
+                current_tags = {tags.DATABASE_TYPE: 'postgres', tags.DATABASE_STATEMENT: db_query}
+            span = _tracer.start_span(operation_name=qualname, child_of=get_current_span(), tags=current_tags)
+            hot = _HotSpan(key, span, now_ns + window_ns)
+            hot.timer = asyncio.get_running_loop().call_later(aggregate_window_ms / 1000, hot.close)
+            _hot_span.set(hot)
+
+        # the span is finished by _HotSpan, not by the scope
+        hot.enter()
+        scope = _tracer.scope_manager.activate(hot.span, False)
         try:
-            result = await f(cls, *args, **kwargs)
+            return await f(*args, **kwargs)
         except Exception as error:
-            span.set_tag(tags.ERROR, True)
-            span.set_tag('error.message', str(error))
+            hot.span.set_tag(tags.ERROR, True)
+            hot.span.set_tag('error.message', str(error))
             raise error
         finally:
             scope.close()
-        return result
+            hot.exit()
 
     return wrapper
 
@@ -1,29 +1,41 @@
 from __future__ import annotations
 
-import copy
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from contextvars import ContextVar
-from typing import TYPE_CHECKING, Any, AsyncGenerator, Collection, Dict, Optional, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Collection,
+    Dict,
+    FrozenSet,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import aiopg
 import aiopg.sa.result
 from aiopg.sa import Engine, SAConnection, create_engine
-from sqlalchemy import orm
+from sqlalchemy import bindparam, orm
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.engine.url import URL
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm.attributes import InstrumentedAttribute
-from sqlalchemy.orm.base import DEFAULT_STATE_ATTR
+from sqlalchemy.orm.attributes import InstrumentedAttribute, set_committed_value
 from sqlalchemy.orm.mapper import Mapper
 from sqlalchemy.sql import ClauseElement
-from sqlalchemy.sql.dml import Insert, Update
+from sqlalchemy.sql.dml import Delete, Insert, Update
+from sqlalchemy.sql.selectable import Select
 from sqlalchemy.sql.schema import Column, Table
 
 logger = logging.getLogger(__name__)
 __db_pool: Optional[Engine] = None
 context_conn: ContextVar[SAConnection] = ContextVar('async_connection')
+CHECK_DB_CONNECTION_TIMEOUT = 2.0
 
 
 if TYPE_CHECKING:
@@ -36,17 +48,79 @@ class AsyncQuery(orm.Query):  # type: ignore
     pass
 
 
+# name of the primary key bind parameter in cached statements
+PK_PARAM = '__pk'
+
+
+class Statements(NamedTuple):
+    """
+    Statements which shape depends on the schema only, values are bound on execution
+    """
+
+    insert: Insert
+    upsert: Insert
+    update_by_pk: Update
+    delete_by_pk: Delete
+    select_by_pk: Select
+
+
+class UpsertMeta(NamedTuple):
+    column_names: FrozenSet[str]
+    # (column name, onupdate value) for columns with onupdate
+    onupdate_columns: Tuple[Tuple[str, Any], ...]
+
+
+def _field_names(fields: Collection[Union[InstrumentedAttribute, str]]) -> FrozenSet[str]:
+    return frozenset(k.key if isinstance(k, InstrumentedAttribute) else k for k in fields)
+
+
 class BaseModelClass:
     __table__: Table
     __mapper__: Mapper
+    _pk_field_cache: Tuple[str, ColumnType]
+    _statements_cache: Statements
+    _upsert_meta_cache: UpsertMeta
+
+    @classmethod
+    def _get_pk_field(cls) -> Tuple[str, ColumnType]:
+        # mapper columns are fixed after class creation, so scan them once per class
+        result: Optional[Tuple[str, ColumnType]] = cls.__dict__.get('_pk_field_cache')
+        if result is None:
+            for field_name, field in cls.__mapper__.columns.items():
+                if field.primary_key:
+                    result = field_name, field
+                    break
+            assert result
+            cls._pk_field_cache = result
+        return result
+
+    @classmethod
+    def _get_statements(cls) -> Statements:
+        result: Optional[Statements] = cls.__dict__.get('_statements_cache')
+        if result is None:
+            _, pk_field = cls._get_pk_field()
+            by_pk = pk_field == bindparam(PK_PARAM)
+            result = Statements(
+                insert=cls.__table__.insert().returning(pk_field),
+                upsert=postgresql.insert(cls.__table__),
+                update_by_pk=cls.__table__.update().where(by_pk),
+                delete_by_pk=cls.__table__.delete().where(by_pk),
+                select_by_pk=cls.__table__.select().where(by_pk).limit(1),
+            )
+            cls._statements_cache = result
+        return result
 
-    def _get_pk_field(self) -> Tuple[str, ColumnType]:
-        result: Optional[Tuple[str, ColumnType]] = None
-        for field_name, field in self.__mapper__.columns.items():
-            if field.primary_key:
-                result = field_name, field
-                break
-        assert result
+    @classmethod
+    def _get_upsert_meta(cls) -> UpsertMeta:
+        result: Optional[UpsertMeta] = cls.__dict__.get('_upsert_meta_cache')
+        if result is None:
+            result = UpsertMeta(
+                column_names=frozenset(column.name for column in cls.__table__.c),
+                onupdate_columns=tuple(
+                    (column.name, column.onupdate.arg) for column in cls.__table__.c if column.onupdate
+                ),
+            )
+            cls._upsert_meta_cache = result
         return result
 
     @property
@@ -60,10 +134,11 @@ class BaseModelClass:
         setattr(self, key, value)
 
     def to_dict(self) -> Dict[str, Any]:
-        values = copy.deepcopy(self.__dict__)
-        if DEFAULT_STATE_ATTR in values:
-            del values[DEFAULT_STATE_ATTR]
-        return values
+        """
+        Returns loaded column values. Values are not copied, mutable ones (e.g. JSON) are shared with the instance
+        """
+        values = self.__dict__
+        return {name: values[name] for name in self.__mapper__.columns.keys() if name in values}
 
     @hybrid_property
     def query(self) -> AsyncQuery:
@@ -72,11 +147,8 @@ class BaseModelClass:
 
     @classmethod
     async def bulk_insert(cls, connection: SAConnection, values_list):  # type: ignore
-        result = await connection.execute(cls.__table__.insert().values(values_list))
-        try:
+        async with connection.execute(cls.__table__.insert().values(values_list)) as result:
             return result.rowcount
-        finally:
-            result.close()
 
     def _prepare_saving(
         self,
@@ -88,12 +160,10 @@ class BaseModelClass:
         Returns primary key field and values, which need to be saved
         """
         values = self.to_dict()
-        if only_fields:
-            only_fields = [k.key if isinstance(k, InstrumentedAttribute) else k for k in only_fields]
-            values = {k: v for k, v in values.items() if k in only_fields}
-        if exclude_fields:
-            exclude_fields = [k.key if isinstance(k, InstrumentedAttribute) else k for k in exclude_fields]
-            values = {k: v for k, v in values.items() if k not in exclude_fields}
+        if only_fields or exclude_fields:
+            only = _field_names(only_fields) if only_fields else None
+            exclude = _field_names(exclude_fields) if exclude_fields else frozenset()
+            values = {k: v for k, v in values.items() if (only is None or k in only) and k not in exclude}
 
         pk_field_name, pk_field = self._get_pk_field()
         if pk_field_name in values:
@@ -102,8 +172,7 @@ class BaseModelClass:
         return pk_field, values
 
     async def delete(self, connection: SAConnection) -> None:
-        _, pk_field = self._get_pk_field()
-        cursor = await connection.execute(self.__table__.delete().where(pk_field == self._pk))
+        cursor = await connection.execute(self._get_statements().delete_by_pk, {PK_PARAM: self._pk})
         cursor.close()
 
     async def save(
@@ -113,12 +182,14 @@ class BaseModelClass:
         exclude_fields: Optional[Collection[Union[InstrumentedAttribute, str]]] = None,
         force_insert: bool = False,
     ) -> bool:
-        pk_field, values = self._prepare_saving(
+        _, values = self._prepare_saving(
             only_fields=only_fields, exclude_fields=exclude_fields, force_insert=force_insert
         )
 
-        async def _execute(query: Union[Insert, Update], values: Dict[str, Any]) -> bool:
-            cursor = await connection.execute(query.values(**values).returning(pk_field))
+        statements = self._get_statements()
+
+        async def _execute(query: Insert, values: Dict[str, Any]) -> bool:
+            cursor = await connection.execute(query.values(**values))
             try:
                 if cursor.returns_rows:
                     _id = await cursor.scalar()
@@ -134,10 +205,10 @@ class BaseModelClass:
 
         if not self._pk or (force_insert is True):
             # INSERT flow
-            return await _execute(self.__table__.insert(), values)
+            return await _execute(statements.insert, values)
         else:
             # Update flow
-            cursor = await connection.execute(self.__table__.update().where(pk_field == self._pk).values(**values))
+            cursor = await connection.execute(statements.update_by_pk.values(**values), {PK_PARAM: self._pk})
             try:
                 if cursor.rowcount:
                     return True
@@ -146,23 +217,27 @@ class BaseModelClass:
         return False
 
     async def refresh(self, connection: SAConnection) -> None:
-        _, pk_field = self._get_pk_field()
-        res = dict(await fetchone(connection, self.__table__.select().where(pk_field == self._pk).limit(1)))
-        for key, value in res.items():
-            setattr(self, key, value)
+        row = await fetchone(connection, self._get_statements().select_by_pk, {PK_PARAM: self._pk})
+        # values come from db, so they are loaded as committed state without change tracking;
+        # only mapped columns are set, attribute names may differ from column keys
+        for attr in self.__mapper__.column_attrs:
+            column_key = attr.columns[0].key
+            if column_key in row:
+                set_committed_value(self, attr.key, row[column_key])
 
     async def upsert(self, connection: SAConnection, constraint_column: Optional[ColumnType]) -> bool:
-        if constraint_column not in [column.name for column in self.__table__.c]:
+        upsert_meta = self._get_upsert_meta()
+        if constraint_column not in upsert_meta.column_names:
             raise Exception(f'Invalid constraint_column {constraint_column}')
 
         pk_field, values = self._prepare_saving()
 
         on_update_fields = {}
-        for column in list(self.__table__.c):
-            if column.onupdate and not values.get(column.name):
-                on_update_fields[column.name] = column.onupdate.arg
+        for column_name, onupdate_arg in upsert_meta.onupdate_columns:
+            if not values.get(column_name):
+                on_update_fields[column_name] = onupdate_arg
 
-        q = postgresql.insert(self.__table__).values(**values)
+        q = self._get_statements().upsert.values(**values)
 
         values.update(on_update_fields)
         q = q.on_conflict_do_update(index_elements=[constraint_column], set_=values)
@@ -182,16 +257,16 @@ class BaseModelClass:
         return False
 
 
-async def _fetch(conn: SAConnection, query: ClauseElement, meth: str) -> aiopg.sa.result.RowProxy:
+async def _fetch(conn: SAConnection, query: ClauseElement, meth: str, *multiparams: Any) -> aiopg.sa.result.RowProxy:
     if isinstance(query, AsyncQuery):
         query = query.statement
-    res = await conn.execute(query)
+    res = await conn.execute(query, *multiparams)
     async with res.cursor:
         return await getattr(res, meth)()
 
 
-async def fetchone(conn: SAConnection, query: ClauseElement) -> aiopg.sa.result.RowProxy:
-    return await _fetch(conn, query, 'fetchone')
+async def fetchone(conn: SAConnection, query: ClauseElement, *multiparams: Any) -> aiopg.sa.result.RowProxy:
+    return await _fetch(conn, query, 'fetchone', *multiparams)
 
 
 @asynccontextmanager
@@ -215,14 +290,18 @@ async def connection_context() -> AsyncGenerator[SAConnection, None]:
     >>>         await obj.save(connection)
     """
     conn = context_conn.get(None)
-    if conn is None:
-        assert __db_pool
-        async with __db_pool.acquire() as conn:
-            context_conn.set(conn)
-            yield conn
-        context_conn.set(None)
-    else:
+    if conn is not None:
         yield conn
+        return
+
+    pool = __db_pool
+    assert pool
+    async with pool.acquire() as conn:
+        token = context_conn.set(conn)
+        try:
+            yield conn
+        finally:
+            context_conn.reset(token)
 
 
 @asynccontextmanager
@@ -284,9 +363,16 @@ async def check_db_connection() -> Tuple[bool, str]:
     if __db_pool is None:
         return False, '__db_pool is None'
 
-    try:
+    async def _select_one() -> None:
         async with connection_context() as conn:
             await conn.execute('select 1;')
+
+    try:
+        # hung pool must not stall the health endpoint
+        await asyncio.wait_for(_select_one(), timeout=CHECK_DB_CONNECTION_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.error('database connection check timed out')
+        return False, 'timeout'
     except Exception as exp:
         logger.exception('unknown connection error')
         return False, str(exp)
@@ -32,7 +32,12 @@ def init_db(connection_url: URL, echo: bool, pool_recycle_seconds: int, pool_siz
         raise PoolAlreadyInitialized('database already initialized')
 
     __db_pool = create_async_engine(
-        connection_url, echo=echo, pool_recycle=pool_recycle_seconds, pool_size=pool_size, pool_pre_ping=True
+        connection_url,
+        echo=echo,
+        pool_recycle=pool_recycle_seconds,
+        pool_size=pool_size,
+        pool_pre_ping=True,
+        pool_use_lifo=True,
     )
     __sessionmaker = sessionmaker(__db_pool, expire_on_commit=False, class_=AsyncSession)
     logger.info('database pool opened')
@@ -1,15 +1,23 @@
 import logging
+import uuid
 from dataclasses import dataclass
 from typing import Optional, Tuple
 
 import aioredis
-from aioredlock import Aioredlock
 
 logger = logging.getLogger(__name__)
 
+# deletes the lock only if it is still held by the same token
+RELEASE_LOCK_SCRIPT = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+)
 
-@dataclass
+
+# dataclass(slots=True) needs python 3.10
+@dataclass(frozen=True)
 class Config:
+    __slots__ = ('host', 'port', 'minsize', 'maxsize', 'locks_db')
+
     host: str
     port: int
     minsize: int
@@ -19,7 +27,8 @@ class Config:
 
 _CONFIG: Optional[Config] = None
 _REDIS_CONN: Optional[aioredis.Redis] = None
-_REDIS_LOCK_MANGER: Optional[Aioredlock] = None
+_REDIS_LOCKS_CONN: Optional[aioredis.Redis] = None
+_RELEASE_LOCK_SHA: Optional[str] = None
 
 
 def init_config(host: str, port: int, minsize: int, maxsize: int, locks_db: int = 1,) -> None:
@@ -28,22 +37,25 @@ def init_config(host: str, port: int, minsize: int, maxsize: int, locks_db: int
     _CONFIG = Config(host=host, port=port, minsize=minsize, maxsize=maxsize, locks_db=locks_db,)
 
 
-async def _init() -> Tuple[aioredis.Redis, Aioredlock]:
+async def _init() -> Tuple[aioredis.Redis, aioredis.Redis]:
     if not _CONFIG:
         raise Exception('Redis not configured. Run init_config(...).')
 
     global _REDIS_CONN
-    global _REDIS_LOCK_MANGER
+    global _REDIS_LOCKS_CONN
 
     if not _REDIS_CONN:
         _REDIS_CONN = await aioredis.create_redis_pool(
             f'redis://{_CONFIG.host}:{_CONFIG.port}', minsize=_CONFIG.minsize, maxsize=_CONFIG.maxsize,
         )
 
-    if not _REDIS_LOCK_MANGER:
-        _REDIS_LOCK_MANGER = Aioredlock([{'host': _CONFIG.host, 'port': _CONFIG.port, 'db': _CONFIG.locks_db,}])
+    # pool is bound to a db, SELECT can't be switched per command on a shared pool
+    if not _REDIS_LOCKS_CONN:
+        _REDIS_LOCKS_CONN = await aioredis.create_redis_pool(
+            f'redis://{_CONFIG.host}:{_CONFIG.port}', db=_CONFIG.locks_db, minsize=1, maxsize=_CONFIG.maxsize,
+        )
 
-    return _REDIS_CONN, _REDIS_LOCK_MANGER
+    return _REDIS_CONN, _REDIS_LOCKS_CONN
 
 
 async def get_conn() -> aioredis.Redis:
@@ -55,37 +67,71 @@ async def get_conn() -> aioredis.Redis:
     return _REDIS_CONN
 
 
-async def get_lock_manager() -> Aioredlock:
-    global _REDIS_LOCK_MANGER
+async def get_locks_conn() -> aioredis.Redis:
+    global _REDIS_LOCKS_CONN
+
+    if not _REDIS_LOCKS_CONN:
+        _, _REDIS_LOCKS_CONN = await _init()
+
+    return _REDIS_LOCKS_CONN
 
-    if not _REDIS_LOCK_MANGER:
-        _, _REDIS_LOCK_MANGER = await _init()
 
-    return _REDIS_LOCK_MANGER
+async def acquire(key: str, ttl_ms: int) -> Optional[str]:
+    """
+    Returns lock token if the lock is acquired, None if it is held by someone else
+    """
+    redis_conn = await get_locks_conn()
+    token = uuid.uuid4().hex
+    if await redis_conn.set(key, token, pexpire=ttl_ms, exist=redis_conn.SET_IF_NOT_EXIST):
+        return token
+    return None
+
+
+async def release(key: str, token: str) -> bool:
+    global _RELEASE_LOCK_SHA
+
+    redis_conn = await get_locks_conn()
+    result = None
+    if _RELEASE_LOCK_SHA:
+        try:
+            result = await redis_conn.evalsha(_RELEASE_LOCK_SHA, keys=[key], args=[token])
+        except aioredis.ReplyError as exp:
+            if not str(exp).startswith('NOSCRIPT'):
+                raise
+            # script cache was flushed, e.g. redis restarted
+            _RELEASE_LOCK_SHA = None
+
+    if not _RELEASE_LOCK_SHA:
+        # loaded on first release, a failed load is retried by the next release
+        _RELEASE_LOCK_SHA = await redis_conn.script_load(RELEASE_LOCK_SCRIPT)
+        result = await redis_conn.evalsha(_RELEASE_LOCK_SHA, keys=[key], args=[token])
+    return bool(result)
 
 
 async def close() -> None:
     global _REDIS_CONN
-    global _REDIS_LOCK_MANGER
+    global _REDIS_LOCKS_CONN
 
     if _REDIS_CONN:
         _REDIS_CONN.close()
         await _REDIS_CONN.wait_closed()
+        _REDIS_CONN = None
 
-    if _REDIS_LOCK_MANGER:
+    if _REDIS_LOCKS_CONN:
         try:
-            await _REDIS_LOCK_MANGER.destroy()
+            _REDIS_LOCKS_CONN.close()
+            await _REDIS_LOCKS_CONN.wait_closed()
         except Exception:
             logger.info('cant close redis connection for distributed lock')
         else:
             logger.info('close redis connection for distributed lock')
+        _REDIS_LOCKS_CONN = None
 
 
 async def check_conn() -> Tuple[bool, str]:
     try:
         redis_conn = await get_conn()
-        await redis_conn.set('test', '123')
-        await redis_conn.get('test')
+        await redis_conn.ping()
     except Exception as exp:
         logger.exception('unknown connection error')
         return False, str(exp)
@@ -5,6 +5,7 @@ import sentry_sdk
 from sentry_sdk import HttpTransport
 from sentry_sdk.integrations.aiohttp import AioHttpIntegration
 from sentry_sdk.integrations.logging import LoggingIntegration
+from urllib3 import Retry
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +15,13 @@ class Transport(HttpTransport):
         super().__init__(options)
 
     def _get_pool_options(self, ca_certs: Optional[Any]) -> Dict[str, Any]:
-        return {"num_pools": 2, "cert_reqs": 'CERT_NONE', "retries": False}
+        return {
+            "num_pools": 2,
+            "cert_reqs": 'CERT_NONE',
+            # one retry, so a dropped keep-alive connection does not lose the event,
+            # allowed_methods=None retries POST too, events are sent with POST
+            "retries": Retry(total=1, backoff_factor=0.1, allowed_methods=None),
+        }
 
 
 def configure_sentry(dsn: str, environment_name: str, version: str, enabled: bool) -> None:
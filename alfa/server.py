@@ -1,6 +1,16 @@
 import datetime as dt
+import importlib.util
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import threading
+import time
 from decimal import Decimal
-from typing import Any, Dict, Optional, Union
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Literal, Mapping, Optional, Union, cast
 
 import orjson
 import uvicorn
@@ -10,17 +20,40 @@ from fastapi.responses import ORJSONResponse
 from fastapi.routing import APIRoute
 from starlette.requests import Request
 from starlette.responses import JSONResponse  # noqa
+from uvicorn.main import STARTUP_FAILURE
 
-from alfa.opentracing import new_sync_span
+from alfa.opentracing import is_tracing_enabled, new_sync_span
 
 from .dto import BaseDTO, InvalidRequestError
 
+try:
+    import msgspec
 
-def default(obj: Any) -> Any:
+    from .dto import FastDTO
+except ImportError:
+    msgspec = None  # type: ignore
+    FastDTO = None  # type: ignore [assignment, misc]
+
+logger = logging.getLogger(__name__)
+
+UVICORN_LOOP: Literal['auto', 'uvloop'] = 'uvloop' if importlib.util.find_spec('uvloop') else 'auto'
+UVICORN_HTTP: Literal['auto', 'httptools'] = 'httptools' if importlib.util.find_spec('httptools') else 'auto'
+
+
+def _decimal_to_float(obj: Decimal) -> float:
+    return float(obj)
+
+
+def _time_to_str(obj: dt.time) -> str:
+    # same as strftime('%H:%M') without format string parsing
+    return f'{obj.hour:02d}:{obj.minute:02d}'
+
+
+def _default_slow(obj: Any) -> Any:
     if isinstance(obj, BaseDTO):
         return obj.dict()
     if isinstance(obj, Decimal):
-        return float(str(obj))
+        return _decimal_to_float(obj)
     if isinstance(obj, dt.date):
         return obj.isoformat()
     if isinstance(obj, dt.datetime):
@@ -29,34 +62,128 @@ def default(obj: Any) -> Any:
         else:
             return obj.isoformat()
     if isinstance(obj, dt.time):
-        return obj.strftime('%H:%M')
+        return _time_to_str(obj)
     if isinstance(obj, (set, frozenset)):
         return list(obj)
+    if FastDTO is not None and isinstance(obj, FastDTO):
+        # decimals are left to orjson default, so they are numbers like in _MSGSPEC_ENCODER
+        return msgspec.to_builtins(obj, builtin_types=(Decimal,))
     raise TypeError
 
 
+# exact type -> encoder, subclasses fall back to _default_slow
+_DEFAULT_ENCODERS: Dict[type, Callable[[Any], Any]] = {
+    Decimal: _decimal_to_float,
+    dt.date: dt.date.isoformat,
+    # datetime is a date subclass, so it has always been encoded by the date branch
+    dt.datetime: dt.datetime.isoformat,
+    dt.time: _time_to_str,
+    set: list,
+    frozenset: list,
+}
+
+
+def default(obj: Any) -> Any:
+    encoder = _DEFAULT_ENCODERS.get(type(obj))
+    if encoder is not None:
+        return encoder(obj)
+    return _default_slow(obj)
+
+
+class _DTOMemo(threading.local):
+    # id(dto) -> dto.dict() for one serialize_to_bytes call, created on the first dto
+    memo: Optional[Dict[int, Any]] = None
+
+
+_dto_memo = _DTOMemo()
+
+
+def _default_with_memo(obj: Any) -> Any:
+    # exact types first, so decimals and dates don't pay for the dto check
+    encoder = _DEFAULT_ENCODERS.get(type(obj))
+    if encoder is not None:
+        return encoder(obj)
+    if isinstance(obj, BaseDTO):
+        # same dto instance may occur many times in one payload, content keeps it alive so id() is stable
+        memo = _dto_memo.memo
+        if memo is None:
+            memo = _dto_memo.memo = {}
+        key = id(obj)
+        result = memo.get(key)
+        if result is None:
+            result = memo[key] = obj.dict()
+        return result
+    return _default_slow(obj)
+
+
+_ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME
+# msgspec encodes decimals as strings by default, orjson default encodes them as numbers
+_MSGSPEC_ENCODER = msgspec.json.Encoder(decimal_format='number') if msgspec is not None else None
+
+
 def serialize_to_bytes(content: Any) -> bytes:
-    if isinstance(content, bytes):
-        return content
-    return orjson.dumps(content, option=orjson.OPT_PASSTHROUGH_DATETIME, default=default)
+    if content.__class__ is bytes:
+        return cast(bytes, content)
+    if FastDTO is not None and isinstance(content, FastDTO):
+        return _MSGSPEC_ENCODER.encode(content)
+    try:
+        return orjson.dumps(content, option=_ORJSON_OPTIONS, default=_default_with_memo)
+    finally:
+        _dto_memo.memo = None
+
+
+# share of responses with a render span, serialization of small payloads is cheaper than the span itself
+RENDER_SPAN_SAMPLE_RATE = 0.1
 
 
 class MyORJSONResponse(JSONResponse):
     media_type = 'application/json'
+    _content_type_header = (b'content-type', media_type.encode('latin-1'))
 
-    @new_sync_span
+    @new_sync_span(sample=RENDER_SPAN_SAMPLE_RATE)
     def render(self, content: Any) -> bytes:
         return serialize_to_bytes(content)
 
+    def init_headers(self, headers: Optional[Mapping[str, str]] = None) -> None:
+        # common case: no extra headers, body is bytes and the default media type (no charset suffix)
+        if (
+            headers is not None
+            or self.media_type is not MyORJSONResponse.media_type
+            or self.status_code < 200
+            or self.status_code in (204, 304)
+        ):
+            super().init_headers(headers)
+            return
+        self.raw_headers = [(b'content-length', str(len(self.body)).encode('latin-1')), self._content_type_header]
+
+
+class PrebuiltJSONResponse(MyORJSONResponse):
+    """
+    Response for already serialized json bytes, body is used as is without serialization and render span
+    """
+
+    def render(self, content: bytes) -> bytes:
+        return content
+
+
+@lru_cache(maxsize=256)
+def _get_error_body(model: Callable[..., BaseDTO], error_code: str) -> bytes:
+    return serialize_to_bytes(model(code=error_code).dict())
+
 
 def get_error(error_responses: Dict[Union[int, str], Dict[str, Any]], status: int, error_code: str) -> MyORJSONResponse:
-    return MyORJSONResponse(status_code=status, content=error_responses[status]['model'](code=error_code).dict())
+    # error bodies are immutable, so they are built once per (model, code)
+    body = _get_error_body(error_responses[status]['model'], error_code)
+    return PrebuiltJSONResponse(status_code=status, content=body)
+
+
+_OPERATION_ID_TABLE = str.maketrans('/', '_')
 
 
 def use_route_names_as_operation_ids(app: FastAPI) -> None:
     for route in app.routes:
-        if isinstance(route, APIRoute):
-            route.operation_id = route.path.replace('/', '_')[1:]
+        if isinstance(route, APIRoute) and not route.operation_id:
+            route.operation_id = route.path.translate(_OPERATION_ID_TABLE)[1:]
 
 
 def install_http_server(
@@ -65,8 +192,11 @@ def install_http_server(
     http_host: str,
     http_port: int,
     configure_logging: Dict[str, Any],
-    limit_concurrency: Optional[int] = None,
-    timeout_keep_alive: int = 5,
+    limit_concurrency: Optional[int] = 1000,
+    timeout_keep_alive: int = 30,
+    workers: int = 1,
+    backlog: int = 2048,
+    limit_max_requests: Optional[int] = None,
 ) -> uvicorn.Server:
     # init fastapi app
     app = FastAPI(title=title, openapi_url=openapi_url, default_response_class=ORJSONResponse)
@@ -77,24 +207,122 @@ def install_http_server(
         host=http_host,
         port=http_port,
         log_config=configure_logging,
+        loop=UVICORN_LOOP,
+        http=UVICORN_HTTP,
+        # AccessLogMiddleware writes access logs
         access_log=False,
+        # over limit_concurrency uvicorn answers 503 instead of queueing
         limit_concurrency=limit_concurrency,
         timeout_keep_alive=timeout_keep_alive,
+        backlog=backlog,
+        # server exits after this many requests, run_http_server restarts workers; a single process
+        # needs an external supervisor to restart it. None - never
+        limit_max_requests=limit_max_requests,
+        # > 1 is used by run_http_server
+        workers=workers,
     )
     uvicorn_server = uvicorn.Server(config=config)
 
     @app.exception_handler(RequestValidationError)
-    async def validation_exception_handler(request: Request, exc: RequestValidationError) -> ORJSONResponse:
-        return ORJSONResponse(
+    async def validation_exception_handler(request: Request, exc: RequestValidationError) -> MyORJSONResponse:
+        return MyORJSONResponse(
             status_code=400,
-            content=InvalidRequestError(
-                code=InvalidRequestError.ErrorCode.INVALID_REQUEST, details=exc.errors()
-            ).dict(),
+            content=InvalidRequestError(code=InvalidRequestError.ErrorCode.INVALID_REQUEST, details=exc.errors()),
         )
 
     use_route_names_as_operation_ids(app)
 
-    # skip uvicorn signals handling
-    do_nothing = lambda *args: None
-    uvicorn_server.install_signal_handlers = do_nothing
+    # skip uvicorn signals handling, workers started by run_http_server need it for graceful shutdown
+    if config.workers <= 1:
+        do_nothing = lambda *args: None
+        uvicorn_server.install_signal_handlers = do_nothing
     return uvicorn_server
+
+
+# seconds between checks of should_exit while waiting for exited http workers
+WORKERS_CHECK_INTERVAL = 0.5
+# worker crashed sooner than this after start is restarted with a doubling delay, up to the max
+WORKERS_MIN_UPTIME = 5.0
+WORKERS_MAX_RESTART_DELAY = 30.0
+
+
+def run_http_server(uvicorn_server: uvicorn.Server) -> None:
+    """
+    Runs server in current process, or in `config.workers` forked processes sharing one listening socket.
+    Exited workers are restarted until SIGINT/SIGTERM, a worker crashing at startup is restarted with a delay.
+
+    Workers are forked after the app is fully configured (middlewares, routes), fork is used instead of
+    uvicorn's spawn supervisor because app instance is not picklable.
+    Background threads are not inherited by workers, so jaeger reporter would never send worker spans:
+    workers > 1 is refused while tracing is enabled. Each worker has its own prometheus registry,
+    so workers > 1 requires `prometheus_multiproc_dir` for /metrics to collect all of them.
+    """
+    config = uvicorn_server.config
+    if config.workers <= 1:
+        uvicorn_server.run()
+        return
+
+    if is_tracing_enabled():
+        raise Exception('Tracing is not supported with workers > 1, jaeger reporter thread is lost on fork.')
+    if 'prometheus_multiproc_dir' not in os.environ:
+        raise Exception('Set prometheus_multiproc_dir to run workers > 1, /metrics collects all workers from it.')
+
+    sock = config.bind_socket()
+    context = multiprocessing.get_context('fork')
+
+    def run_worker() -> None:
+        uvicorn_server.run(sockets=[sock])
+        if not uvicorn_server.started:
+            # e.g. lifespan startup error, otherwise the worker exits with 0 like after limit_max_requests
+            sys.exit(STARTUP_FAILURE)
+
+    def start_worker() -> multiprocessing.process.BaseProcess:
+        process = context.Process(target=run_worker)
+        process.start()
+        return process
+
+    should_exit = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *args: should_exit.set())
+
+    processes: List[Optional[multiprocessing.process.BaseProcess]] = [start_worker() for _ in range(config.workers)]
+    started_at = [time.monotonic()] * config.workers
+    restart_at = [0.0] * config.workers
+    restart_delays = [0.0] * config.workers
+    logger.info(f'started {len(processes)} http workers')
+
+    while not should_exit.is_set():
+        # worker exits on limit_max_requests or crash, it is replaced so the socket is always served
+        sentinels = [process.sentinel for process in processes if process is not None]
+        multiprocessing.connection.wait(sentinels, timeout=WORKERS_CHECK_INTERVAL)
+        now = time.monotonic()
+        for index, process in enumerate(processes):
+            if should_exit.is_set():
+                break
+            if process is not None:
+                if process.is_alive():
+                    continue
+                process.join()
+                if process.exitcode != 0 and now - started_at[index] < WORKERS_MIN_UPTIME:
+                    restart_delays[index] = min(
+                        max(restart_delays[index] * 2, WORKERS_CHECK_INTERVAL), WORKERS_MAX_RESTART_DELAY
+                    )
+                else:
+                    restart_delays[index] = 0.0
+                logger.info(
+                    f'http worker {process.pid} exited with code {process.exitcode}, '
+                    f'restarting in {restart_delays[index]}s'
+                )
+                processes[index] = None
+                restart_at[index] = now + restart_delays[index]
+            if now >= restart_at[index]:
+                processes[index] = start_worker()
+                started_at[index] = now
+
+    running = [process for process in processes if process is not None]
+    for process in running:
+        # SIGTERM, uvicorn in worker shuts down gracefully
+        process.terminate()
+    for process in running:
+        process.join()
+    sock.close()
@@ -0,0 +1,27 @@
+from typing import Iterator
+
+import pytest
+from jaeger_client import Tracer
+from jaeger_client.codecs import B3Codec
+from jaeger_client.reporter import InMemoryReporter
+from jaeger_client.sampler import ConstSampler
+from opentracing.propagation import Format
+from opentracing.scope_managers.contextvars import ContextVarsScopeManager
+
+from alfa import opentracing
+
+
+@pytest.fixture
+def tracer(monkeypatch: pytest.MonkeyPatch) -> Iterator[Tracer]:
+    # spans are kept in tracer.reporter, b3 headers are extracted and injected like in services
+    tracer = Tracer(
+        service_name='test',
+        reporter=InMemoryReporter(),
+        sampler=ConstSampler(True),
+        scope_manager=ContextVarsScopeManager(),
+        extra_codecs={Format.HTTP_HEADERS: B3Codec()},
+    )
+    monkeypatch.setattr(opentracing, 'tracer', tracer)
+    monkeypatch.setattr(opentracing, '_TRACING_ENABLED', True)
+    yield tracer
+    tracer.close()
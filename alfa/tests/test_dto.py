@@ -0,0 +1,27 @@
+import json
+from typing import Dict
+
+from alfa.dto import BaseDTO
+
+
+class _Names(BaseDTO):
+    names: Dict[int, str]
+
+
+def test_dto_json() -> None:
+    dto = _Names(names={1: 'один'})
+
+    assert json.loads(dto.json()) == {'names': {'1': 'один'}}
+    assert dto.json(indent=2) == json.dumps({'names': {'1': 'один'}}, indent=2)
+    assert dto.json(ensure_ascii=False) == '{"names": {"1": "один"}}'
+    assert _Names.parse_raw(dto.json()) == dto
+
+
+class _Wrapper(BaseDTO):
+    inner: _Names
+
+
+def test_dto_nested_model_is_not_copied() -> None:
+    inner = _Names(names={1: 'один'})
+
+    assert _Wrapper(inner=inner).inner is inner
@@ -0,0 +1,105 @@
+from typing import Any, Dict, List
+
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jaeger_client import Tracer
+
+from alfa.dto import UnknownError
+from alfa.middleware import (
+    AccessLogMiddleware,
+    ExceptionMiddleware,
+    StarletteTracingMiddleWare,
+    TracingResponseHeadersMiddleware,
+)
+
+
+def _get_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get('/ok')
+    async def ok() -> Dict[str, Any]:
+        return {'ok': True}
+
+    @app.get('/alive')
+    async def alive() -> Dict[str, Any]:
+        return {'ok': True}
+
+    @app.get('/error')
+    async def error() -> None:
+        raise ValueError('boom')
+
+    return app
+
+
+def test_exception_middleware_returns_unknown_error() -> None:
+    app = _get_app()
+    app.add_middleware(ExceptionMiddleware)
+
+    response = TestClient(app, raise_server_exceptions=False).get('/error')
+
+    body = orjson.dumps(UnknownError(code=UnknownError.ErrorCode.UNKNOWN).dict())
+    assert response.status_code == 500
+    assert response.content == body
+    assert response.headers['content-type'] == 'application/json'
+    assert response.headers['content-length'] == str(len(body))
+
+
+@pytest.mark.asyncio
+async def test_exception_middleware_after_response_start() -> None:
+    async def app(scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        raise ValueError('boom')
+
+    messages: List[Dict[str, Any]] = []
+
+    async def send(message: Dict[str, Any]) -> None:
+        messages.append(message)
+
+    await ExceptionMiddleware(app)({'type': 'http', 'path': '/stream'}, None, send)
+
+    assert [message['type'] for message in messages] == ['http.response.start']
+    assert messages[0]['status'] == 200
+
+
+def test_tracing_headers_without_span() -> None:
+    app = _get_app()
+    app.add_middleware(TracingResponseHeadersMiddleware)
+
+    response = TestClient(app).get('/ok')
+
+    assert response.status_code == 200
+    assert response.headers['x-trace-id'] == ''
+
+
+def test_tracing_headers_with_b3_span(tracer: Tracer) -> None:
+    app = _get_app()
+    app.add_middleware(TracingResponseHeadersMiddleware)
+    app.add_middleware(StarletteTracingMiddleWare, tracer=tracer, component_name='test')
+
+    trace_id = '463ac35c9f6413ad'
+    response = TestClient(app).get(
+        '/ok', headers={'X-B3-TraceId': trace_id, 'X-B3-SpanId': 'a2fb4a1d1a96d312', 'X-B3-Sampled': '1'}
+    )
+
+    assert response.status_code == 200
+    assert response.headers['x-trace-id'] == trace_id
+    assert response.headers['x-b3-traceid'] == trace_id
+    assert 'x-b3-spanid' in response.headers
+
+
+def test_skip_paths_pass_through(tracer: Tracer, caplog: pytest.LogCaptureFixture) -> None:
+    app = _get_app()
+    app.add_middleware(TracingResponseHeadersMiddleware)
+    app.add_middleware(AccessLogMiddleware)
+    app.add_middleware(StarletteTracingMiddleWare, tracer=tracer, component_name='test')
+
+    with caplog.at_level('INFO', logger='alfa.middleware'):
+        response = TestClient(app).get('/alive')
+
+    assert response.status_code == 200
+    assert response.json() == {'ok': True}
+    assert 'x-trace-id' not in response.headers
+    assert not [record for record in caplog.records if record.name == 'alfa.middleware']
+    assert not tracer.reporter.get_spans()
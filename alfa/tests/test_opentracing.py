@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Dict
+
+import pytest
+from jaeger_client import Tracer
+
+from alfa.opentracing import trace_hot
+
+
+def _get_tags(span: Any) -> Dict[str, Any]:
+    return {tag.key: tag for tag in span.tags}
+
+
+@trace_hot(aggregate_window_ms=50)
+async def _hot_call(delay: float = 0, fail: bool = False) -> None:
+    await asyncio.sleep(delay)
+    if fail:
+        raise ValueError('boom')
+
+
+@pytest.mark.asyncio
+async def test_trace_hot_aggregates_calls(tracer: Tracer) -> None:
+    for _ in range(3):
+        await _hot_call()
+    await asyncio.sleep(0.1)
+
+    spans = tracer.reporter.get_spans()
+    assert len(spans) == 1
+    assert _get_tags(spans[0])['batch.count'].vLong == 3
+
+
+@pytest.mark.asyncio
+async def test_trace_hot_span_ends_with_last_call(tracer: Tracer) -> None:
+    await _hot_call()
+    await asyncio.sleep(0.1)
+
+    span = tracer.reporter.get_spans()[0]
+    # the span is not stretched to the aggregate window
+    assert span.end_time - span.start_time < 0.04
+
+
+@pytest.mark.asyncio
+async def test_trace_hot_long_call_outlives_window(tracer: Tracer) -> None:
+    task = asyncio.create_task(_hot_call(delay=0.2, fail=True))
+    await asyncio.sleep(0.1)
+    # window is over, but the call still holds the span
+    assert not tracer.reporter.get_spans()
+
+    with pytest.raises(ValueError):
+        await task
+
+    span = tracer.reporter.get_spans()[0]
+    assert span.end_time - span.start_time >= 0.2
+    assert _get_tags(span)['error'].vBool
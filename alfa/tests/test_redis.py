@@ -1,3 +1,5 @@
+import uuid
+
 import pytest
 
 from alfa import redis
@@ -10,3 +12,50 @@ async def test_redis() -> None:
     ok, error = await redis.check_conn()
     assert ok
     assert error == ''
+    await redis.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_lock() -> None:
+    redis.init_config(host='0.0.0.0', port=6379, minsize=5, maxsize=10)
+    key = f'test-lock-{uuid.uuid4().hex}'
+
+    token = await redis.acquire(key, ttl_ms=10_000)
+    assert token
+    assert await redis.acquire(key, ttl_ms=10_000) is None
+
+    assert not await redis.release(key, 'another-token')
+    assert await redis.release(key, token)
+    assert not await redis.release(key, token)
+
+    token = await redis.acquire(key, ttl_ms=10_000)
+    assert token
+    assert await redis.release(key, token)
+    await redis.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_lock_expires() -> None:
+    redis.init_config(host='0.0.0.0', port=6379, minsize=5, maxsize=10)
+    key = f'test-lock-{uuid.uuid4().hex}'
+
+    token = await redis.acquire(key, ttl_ms=1)
+    assert token
+    redis_conn = await redis.get_locks_conn()
+    while await redis_conn.exists(key):
+        pass
+    assert await redis.acquire(key, ttl_ms=10_000)
+    await redis.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_release_reloads_script() -> None:
+    redis.init_config(host='0.0.0.0', port=6379, minsize=5, maxsize=10)
+    key = f'test-lock-{uuid.uuid4().hex}'
+
+    token = await redis.acquire(key, ttl_ms=10_000)
+    assert token
+    # unknown sha behaves like a flushed script cache
+    redis._RELEASE_LOCK_SHA = '0' * 40
+    assert await redis.release(key, token)
+    await redis.close()
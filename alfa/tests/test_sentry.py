@@ -0,0 +1,40 @@
+import socket
+import threading
+from typing import List
+
+import sentry_sdk
+
+from alfa.sentry import Transport
+
+
+def _serve(server: socket.socket, accepted: List[int]) -> None:
+    # first connection is dropped without response, second one gets 200
+    for attempt in range(2):
+        conn, _ = server.accept()
+        accepted.append(attempt)
+        conn.recv(65536)
+        if attempt:
+            conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+        conn.close()
+
+
+def test_transport_retries_dropped_post() -> None:
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    port = server.getsockname()[1]
+    accepted: List[int] = []
+    thread = threading.Thread(target=_serve, args=(server, accepted), daemon=True)
+    thread.start()
+
+    client = sentry_sdk.Client(dsn=f'http://key@127.0.0.1:{port}/1', transport=Transport)
+    try:
+        response = client.transport._pool.request(  # type: ignore
+            'POST', f'http://127.0.0.1:{port}/api/1/store/', body=b'{}'
+        )
+    finally:
+        client.close()
+        server.close()
+
+    assert response.status == 200
+    assert accepted == [0, 1]
@@ -0,0 +1,82 @@
+import datetime as dt
+from decimal import Decimal
+from typing import Any
+
+import orjson
+import pytest
+
+from alfa import server
+from alfa.dto import BaseDTO
+from alfa.server import FastDTO, MyORJSONResponse, install_http_server, run_http_server, serialize_to_bytes
+
+
+def test_response_headers_fast_path() -> None:
+    response = MyORJSONResponse(content={'ok': True})
+
+    assert response.raw_headers == [
+        (b'content-length', str(len(response.body)).encode('latin-1')),
+        (b'content-type', b'application/json'),
+    ]
+
+
+def test_response_headers_respect_media_type() -> None:
+    response = MyORJSONResponse(content={'ok': True}, media_type='application/problem+json')
+
+    assert dict(response.raw_headers)[b'content-type'] == b'application/problem+json'
+
+
+def test_response_headers_respect_subclass_media_type() -> None:
+    class TextResponse(MyORJSONResponse):
+        media_type = 'text/plain'
+
+    response = TextResponse(content={'ok': True})
+
+    assert dict(response.raw_headers)[b'content-type'] == b'text/plain; charset=utf-8'
+
+
+def test_run_http_server_refuses_workers_with_tracing(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(server, 'is_tracing_enabled', lambda: True)
+    monkeypatch.setenv('prometheus_multiproc_dir', '/tmp')
+
+    with pytest.raises(Exception, match='Tracing'):
+        run_http_server(install_http_server('test', '/openapi.json', '127.0.0.1', 0, None, workers=2))
+
+
+def test_run_http_server_requires_prometheus_multiproc_dir(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv('prometheus_multiproc_dir', raising=False)
+
+    with pytest.raises(Exception, match='prometheus_multiproc_dir'):
+        run_http_server(install_http_server('test', '/openapi.json', '127.0.0.1', 0, None, workers=2))
+
+
+if FastDTO is not None:
+
+    class _FastItem(FastDTO):
+        price: Decimal
+        day: dt.date
+        at: dt.time
+        name: str
+
+    class _Item(BaseDTO):
+        price: Decimal
+        day: dt.date
+        name: str
+
+    class _Wrapper(BaseDTO):
+        item: Any
+
+
+@pytest.mark.skipif(FastDTO is None, reason='msgspec is not installed')
+def test_fast_dto_matches_base_dto() -> None:
+    fields = {'price': Decimal('1.1'), 'day': dt.date(2020, 1, 2), 'name': 'x'}
+    fast = _FastItem(at=dt.time(3, 4), **fields)
+
+    top_level = orjson.loads(serialize_to_bytes(fast))
+    nested_in_dict = orjson.loads(serialize_to_bytes({'item': fast}))['item']
+    nested_in_dto = orjson.loads(serialize_to_bytes(_Wrapper(item=fast)))['item']
+
+    assert top_level == nested_in_dict == nested_in_dto
+    assert top_level['price'] == 1.1
+    # time format differs from BaseDTO, see FastDTO
+    assert top_level.pop('at') == '03:04:00'
+    assert top_level == orjson.loads(serialize_to_bytes(_Item(**fields)))
@@ -3,30 +3,34 @@ import logging
 from functools import wraps
 from typing import Any, Callable
 
-import pytz
-
 logger = logging.getLogger(__name__)
 
+UTC = dt.timezone.utc
+
 
 def get_now() -> dt.datetime:
-    return dt.datetime.now(pytz.utc).replace(second=0, microsecond=0)
+    return dt.datetime.now(UTC).replace(second=0, microsecond=0)
 
 
 def get_now_with_seconds() -> dt.datetime:
-    return dt.datetime.now(pytz.utc).replace(microsecond=0)
+    return dt.datetime.now(UTC).replace(microsecond=0)
 
 
 def run_once(f: Callable[..., Any]) -> Callable[..., Any]:
+    # a flag is enough: wrapper runs on one event loop and doesn't await between the check and the set,
+    # asyncio.Lock would add no thread-safety either
     running = False
 
     @wraps(f)
     async def wrapper() -> Any:
         nonlocal running
         if running:
-            logger.debug(f'{f.__qualname__} already running')
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f'{f.__qualname__} already running')
             return
 
-        logger.debug(f'{f.__qualname__} is not running, run it')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'{f.__qualname__} is not running, run it')
         running = True
         result: Any = None
         try: